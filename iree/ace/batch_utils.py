@@ -0,0 +1,302 @@
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from iree.compiler.ir import (
+    Attribute,
+    DenseElementsAttr,
+    FloatAttr,
+    FunctionType,
+    IndexType,
+    IntegerAttr,
+    IntegerType,
+    Location,
+    Operation,
+    RankedTensorType,
+    Type,
+    TypeAttr,
+    Value,
+)
+
+from .builder import Builder, FunctionBuilder
+from .merge_utils import TopLevelOpIndex, null_logger
+
+
+def widen_batch_type(t: Type, batch_size: int) -> RankedTensorType:
+    """Replaces the leading unit batch dimension of a tensor type."""
+    tt = RankedTensorType(t)
+    shape = list(tt.shape)
+    if tt.rank == 0 or tt.is_dynamic_dim(0) or shape[0] != 1:
+        raise ValueError(f"Expected a leading unit batch dimension in {t}")
+    shape[0] = batch_size
+    with Location.unknown(tt.context):
+        return RankedTensorType.get(shape, tt.element_type)
+
+
+def zero_splat(t: Type) -> Attribute:
+    """Creates a zero splat initial value for a tensor type."""
+    tt = RankedTensorType(t)
+    et = tt.element_type
+    with Location.unknown(tt.context):
+        if IntegerType.isinstance(et) or IndexType.isinstance(et):
+            element_attr = IntegerAttr.get(et, 0)
+        else:
+            element_attr = FloatAttr.get(et, 0.0)
+        return DenseElementsAttr.get_splat(tt, element_attr)
+
+
+def get_sequence_dim(t: Type) -> int:
+    """Gets the single dynamic (sequence) dimension of a state type."""
+    tt = RankedTensorType(t)
+    dynamic_dims = [i for i in range(1, tt.rank) if tt.is_dynamic_dim(i)]
+    if len(dynamic_dims) != 1:
+        raise ValueError(f"Expected state like 1x32x?x128 with one dynamic dim: {t}")
+    return dynamic_dims[0]
+
+
+class StepBatcher:
+    """Widens a single sequence step function to serve a batch of slots.
+
+    The step function is expected to have a signature like:
+      (inputs..., states...) -> (results..., updated_states...)
+    where every type has a leading unit batch dimension and each state has
+    a single dynamic sequence dimension. Each updated state is one sequence
+    position longer than the state passed in. Results must otherwise be
+    statically shaped.
+
+    The batched variant keeps the states in zero initialized globals with a
+    leading dimension of `batch_size` and the sequence dimension fixed at
+    `context_size`. A zero initialized `tensor<Bxi32>` global tracks the step
+    count of each slot. The public entry has the signature:
+      (batched_inputs..., active: tensor<Bxi1>)
+          -> (batched_results..., advanced: tensor<Bxi1>)
+    A slot is advanced only if it is `active` and its updated state still
+    fits in `context_size`; `advanced` reports which slots were. Results of
+    slots that were not advanced are zero.
+
+    Note that the step function body is not re-batched: the entry calls it
+    once per advanced slot, so this amortizes invocation overhead and lets
+    one artifact serve concurrent sequences, but does not widen the compute
+    of the step itself.
+    """
+
+    def __init__(
+        self,
+        module_op: Operation,
+        index: TopLevelOpIndex,
+        step_op: Operation,
+        batch_size: int,
+        context_size: int,
+        *,
+        num_inputs: int = 1,
+        num_results: int = 1,
+        logger=None,
+    ):
+        self.module_op = module_op
+        self.index = index
+        self.step_op = step_op
+        self.batch_size = batch_size
+        self.context_size = context_size
+        self.logger = logger if logger else null_logger
+        ftype = FunctionType(TypeAttr(step_op.attributes["function_type"]).value)
+        input_types = list(ftype.inputs)
+        result_types = list(ftype.results)
+        self.input_types = input_types[:num_inputs]
+        self.state_types = input_types[num_inputs:]
+        self.result_types = result_types[:num_results]
+        if len(result_types) - num_results != len(self.state_types):
+            raise ValueError(
+                f"Step function has {len(self.state_types)} state inputs but "
+                f"{len(result_types) - num_results} state results"
+            )
+        for t in self.result_types:
+            if not RankedTensorType(t).has_static_shape:
+                raise ValueError(f"Expected statically shaped step result: {t}")
+        self.sequence_dims = [get_sequence_dim(t) for t in self.state_types]
+
+    def batch(self, name: str) -> Operation:
+        """Defines the batched entry `name` and a `{name}_reset` companion.
+
+        Returns the batched function operation.
+        """
+        builder = Builder(self.module_op, self.index)
+        state_globals = []
+        for i, (t, seq_dim) in enumerate(zip(self.state_types, self.sequence_dims)):
+            state_type = self._state_global_type(t, seq_dim)
+            state_globals.append(
+                builder.define_global(
+                    f"_{name}_context_{i}",
+                    state_type,
+                    mutable=True,
+                    initial_value=zero_splat(state_type),
+                )
+            )
+        with Location.unknown(self.module_op.context):
+            counts_type = RankedTensorType.get(
+                [self.batch_size], builder.integer_type(32)
+            )
+            mask_type = RankedTensorType.get(
+                [self.batch_size], builder.integer_type(1)
+            )
+        counts_global = builder.define_global(
+            f"_{name}_step_counts",
+            counts_type,
+            mutable=True,
+            initial_value=zero_splat(counts_type),
+        )
+        self.logger(
+            f"Batching step function into {name} with {self.batch_size} slots "
+            f"of context size {self.context_size}"
+        )
+
+        batched_result_types = [
+            widen_batch_type(t, self.batch_size) for t in self.result_types
+        ]
+        fb = builder.define_function(
+            name,
+            input_types=[
+                widen_batch_type(t, self.batch_size) for t in self.input_types
+            ]
+            + [mask_type],
+            result_types=batched_result_types + [mask_type],
+            public=True,
+        )
+        inputs = list(fb.arguments)[: len(self.input_types)]
+        active = fb.arguments[len(self.input_types)]
+        zero = fb.constant_index(0)
+        context_size = fb.constant_int(self.context_size, 32)
+        counts = fb.load_global(counts_global)
+        states = [fb.load_global(g) for g in state_globals]
+        results = [
+            fb.tensor_splat(fb.constant_zero(RankedTensorType(t).element_type), t)
+            for t in batched_result_types
+        ]
+        advanced = fb.tensor_splat(fb.constant_int(0, 1), mask_type)
+        for slot in range(self.batch_size):
+            slot_index = fb.constant_index(slot)
+            count_i32 = fb.tensor_extract(counts, slot_index)
+            # The updated state is count + 1 long, so it must be < context_size
+            # to be stored without overflowing the state globals.
+            advance = fb.andi(
+                fb.tensor_extract(active, slot_index),
+                fb.cmpi("slt", count_i32, context_size),
+            )
+            carried = [*states, counts, *results]
+            if_op = fb.scf_if(advance, [v.type for v in carried])
+            with fb.insert_into(if_op.regions[0].blocks[0]):
+                new_states, new_counts, new_results = self._advance_slot(
+                    fb, slot_index, zero, count_i32, inputs, states, counts, results
+                )
+                fb.scf_yield(*new_states, new_counts, *new_results)
+            with fb.insert_into(if_op.regions[1].blocks[0]):
+                fb.scf_yield(*carried)
+            carried = list(if_op.results)
+            states = carried[: len(states)]
+            counts = carried[len(states)]
+            results = carried[len(states) + 1 :]
+            advanced = fb.tensor_insert(advance, advanced, slot_index)
+
+        for update, global_op in zip(states, state_globals):
+            fb.store_global(global_op, update)
+        fb.store_global(counts_global, counts)
+        fb.ret(*results, advanced)
+
+        self._define_reset(builder, f"{name}_reset", counts_global)
+        return fb.f_op
+
+    def _advance_slot(
+        self,
+        fb: FunctionBuilder,
+        slot_index: Value,
+        zero: Value,
+        count_i32: Value,
+        inputs: Sequence[Value],
+        states: Sequence[Value],
+        counts: Value,
+        results: Sequence[Value],
+    ) -> Tuple[List[Value], Value, List[Value]]:
+        count = fb.cast_to_index(count_i32)
+        slot_inputs = [
+            fb.tensor_slice(
+                arg,
+                self._slot_starts(arg, slot_index, zero),
+                self._slot_lengths(fb, arg),
+                t,
+            )
+            for arg, t in zip(inputs, self.input_types)
+        ]
+        slot_states = [
+            fb.tensor_slice(
+                state,
+                self._slot_starts(state, slot_index, zero),
+                self._state_lengths(fb, t, seq_dim, count),
+                t,
+            )
+            for state, t, seq_dim in zip(states, self.state_types, self.sequence_dims)
+        ]
+        slot_results = fb.call(self.step_op, *slot_inputs, *slot_states)
+        slot_results, updates = (
+            slot_results[: len(self.result_types)],
+            slot_results[len(self.result_types) :],
+        )
+        new_states = [
+            fb.tensor_update(state, self._slot_starts(state, slot_index, zero), update)
+            for state, update in zip(states, updates)
+        ]
+        new_results = [
+            fb.tensor_update(result, self._slot_starts(result, slot_index, zero), r)
+            for result, r in zip(results, slot_results)
+        ]
+        new_counts = fb.tensor_insert(fb.addi_imm(count_i32, 1), counts, slot_index)
+        return new_states, new_counts, new_results
+
+    def _define_reset(self, builder: Builder, name: str, counts_global: Operation):
+        # Resetting a slot only needs to zero its count: states are only ever
+        # read up to the current count. Slots outside of [0, batch_size) are
+        # ignored rather than inserted out of bounds.
+        with Location.unknown(self.module_op.context):
+            index_type = IndexType.get()
+        fb = builder.define_function(
+            name, input_types=[index_type], result_types=[], public=True
+        )
+        slot_index = fb.arguments[0]
+        counts = fb.load_global(counts_global)
+        in_range = fb.cmpi("ult", slot_index, fb.constant_index(self.batch_size))
+        if_op = fb.scf_if(in_range, [counts.type])
+        with fb.insert_into(if_op.regions[0].blocks[0]):
+            fb.scf_yield(fb.tensor_insert(fb.constant_int(0, 32), counts, slot_index))
+        with fb.insert_into(if_op.regions[1].blocks[0]):
+            fb.scf_yield(counts)
+        fb.store_global(counts_global, if_op.results[0])
+        fb.ret()
+
+    def _state_global_type(self, t: Type, seq_dim: int) -> RankedTensorType:
+        tt = widen_batch_type(t, self.batch_size)
+        shape = list(tt.shape)
+        shape[seq_dim] = self.context_size
+        with Location.unknown(tt.context):
+            return RankedTensorType.get(shape, tt.element_type)
+
+    def _slot_starts(self, value: Value, slot_index: Value, zero: Value) -> List[Value]:
+        rank = RankedTensorType(value.type).rank
+        return [slot_index] + [zero] * (rank - 1)
+
+    def _slot_lengths(self, fb: FunctionBuilder, value: Value) -> List[Value]:
+        tt = RankedTensorType(value.type)
+        lengths = [fb.constant_index(1)]
+        for i in range(1, tt.rank):
+            if tt.is_dynamic_dim(i):
+                lengths.append(fb.tensor_dim(value, fb.constant_index(i)))
+            else:
+                lengths.append(fb.constant_index(tt.get_dim_size(i)))
+        return lengths
+
+    def _state_lengths(
+        self, fb: FunctionBuilder, t: Type, seq_dim: int, count: Value
+    ) -> List[Value]:
+        tt = RankedTensorType(t)
+        lengths = [fb.constant_index(1)]
+        for i in range(1, tt.rank):
+            if i == seq_dim:
+                lengths.append(count)
+            else:
+                lengths.append(fb.constant_index(tt.get_dim_size(i)))
+        return lengths
@@ -1,9 +1,12 @@
-from typing import Any, Dict, List, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Union
+import contextlib
 
 from iree.compiler.ir import (
+    Attribute,
     Block,
     Context,
     FlatSymbolRefAttr,
+    FloatAttr,
     FunctionType,
     IndexType,
     InsertionPoint,
@@ -13,6 +16,7 @@ from iree.compiler.ir import (
     Module,
     Operation,
     OpView,
+    RankedTensorType,
     StringAttr,
     SymbolTable,
     Type,
@@ -21,6 +25,8 @@ from iree.compiler.ir import (
     Value,
 )
 
+from .merge_utils import TopLevelOpIndex
+
 
 class TensorSliceOp(OpView):
     OPERATION_NAME = "flow.tensor.slice"
@@ -32,9 +38,27 @@ class TensorUpdateOp(OpView):
     _ODS_OPERAND_SEGMENTS = [1, -1, -1, 1, -1]
 
 
+# Values of the arith.cmpi predicate enum.
+CMPI_PREDICATES = {
+    "eq": 0,
+    "ne": 1,
+    "slt": 2,
+    "sle": 3,
+    "sgt": 4,
+    "sge": 5,
+    "ult": 6,
+    "ule": 7,
+    "ugt": 8,
+    "uge": 9,
+}
+
+
 class Builder:
-    def __init__(self, module_op: Operation):
+    def __init__(self, module_op: Operation, index: Optional[TopLevelOpIndex] = None):
         self.module_op = module_op
+        # If given, ops defined by the builder are also added to the index so
+        # that it can continue to be shared without rescanning the module.
+        self.index = index
         self.st = SymbolTable(self.module_op)
         self.loc = Location.unknown(self.module_op.context)
         self.body = self.module_op.regions[0].blocks[0]
@@ -43,7 +67,14 @@ class Builder:
         with self.loc:
             return IntegerType.get_signless(bitwidth)
 
-    def define_global(self, name: str, type: Type, *, mutable: bool) -> Operation:
+    def define_global(
+        self,
+        name: str,
+        type: Type,
+        *,
+        mutable: bool,
+        initial_value: Optional[Attribute] = None,
+    ) -> Operation:
         with self.loc, InsertionPoint.at_block_begin(self.body):
             attrs = {
                 "sym_name": StringAttr.get(name),
@@ -52,8 +83,12 @@ class Builder:
             }
             if mutable:
                 attrs["is_mutable"] = UnitAttr.get()
+            if initial_value is not None:
+                attrs["initial_value"] = initial_value
             global_op = Operation.create("util.global", attributes=attrs)
             self.st.insert(global_op)
+        if self.index is not None:
+            self.index.add(global_op)
         return global_op
 
     def define_function(
@@ -74,6 +109,8 @@ class Builder:
                 attrs["sym_visibility"] = StringAttr.get("private")
             f_op = Operation.create("func.func", attributes=attrs, regions=1)
             self.st.insert(f_op)
+        if self.index is not None:
+            self.index.add(f_op)
         return FunctionBuilder(f_op, input_types, result_types)
 
 
@@ -91,6 +128,16 @@ class FunctionBuilder:
     def arguments(self):
         return self.body.arguments
 
+    @contextlib.contextmanager
+    def insert_into(self, block: Block):
+        """Temporarily directs all building to the end of `block`."""
+        saved_ip = self.ip
+        self.ip = InsertionPoint(block)
+        try:
+            yield
+        finally:
+            self.ip = saved_ip
+
     def addi_imm(self, input: Value, imm: int) -> Value:
         with self.ip, self.loc:
             t = input.type
@@ -105,6 +152,26 @@ class FunctionBuilder:
                 operands=[input, imm_value],
             ).result
 
+    def andi(self, lhs: Value, rhs: Value) -> Value:
+        with self.ip, self.loc:
+            return Operation.create(
+                "arith.andi", results=[lhs.type], operands=[lhs, rhs]
+            ).result
+
+    def cmpi(self, predicate: str, lhs: Value, rhs: Value) -> Value:
+        with self.ip, self.loc:
+            attrs = {
+                "predicate": IntegerAttr.get(
+                    IntegerType.get_signless(64), CMPI_PREDICATES[predicate]
+                ),
+            }
+            return Operation.create(
+                "arith.cmpi",
+                results=[IntegerType.get_signless(1)],
+                operands=[lhs, rhs],
+                attributes=attrs,
+            ).result
+
     def cast_to_index(self, input: Value) -> Value:
         with self.ip, self.loc:
             return Operation.create(
@@ -129,6 +196,16 @@ class FunctionBuilder:
                 attributes={"value": IntegerAttr.get(int_type, value)},
             ).result
 
+    def constant_zero(self, t: Type) -> Value:
+        with self.ip, self.loc:
+            if IntegerType.isinstance(t) or IndexType.isinstance(t):
+                value = IntegerAttr.get(t, 0)
+            else:
+                value = FloatAttr.get(t, 0.0)
+            return Operation.create(
+                "arith.constant", results=[t], attributes={"value": value}
+            ).result
+
     def load_global(self, global_op: Operation) -> Value:
         sym_name = global_op.attributes["sym_name"]
         t = TypeAttr(global_op.attributes["type"]).value
@@ -170,6 +247,83 @@ class FunctionBuilder:
                 "tensor.dim", results=[IndexType.get()], operands=[input, dim]
             ).result
 
+    def dynamic_dims(self, input: Value) -> List[Value]:
+        tt = RankedTensorType(input.type)
+        return [
+            self.tensor_dim(input, self.constant_index(i))
+            for i in range(tt.rank)
+            if tt.is_dynamic_dim(i)
+        ]
+
+    def tensor_extract(self, input: Value, *indices: Value) -> Value:
+        element_type = RankedTensorType(input.type).element_type
+        with self.ip, self.loc:
+            return Operation.create(
+                "tensor.extract", results=[element_type], operands=[input, *indices]
+            ).result
+
+    def tensor_insert(self, scalar: Value, dest: Value, *indices: Value) -> Value:
+        with self.ip, self.loc:
+            return Operation.create(
+                "tensor.insert", results=[dest.type], operands=[scalar, dest, *indices]
+            ).result
+
+    def tensor_splat(
+        self, value: Value, result_type: Type, dynamic_sizes: Sequence[Value] = ()
+    ) -> Value:
+        with self.ip, self.loc:
+            return Operation.create(
+                "flow.tensor.splat",
+                results=[result_type],
+                operands=[value, *dynamic_sizes],
+            ).result
+
+    def tensor_slice(
+        self,
+        source: Value,
+        start_indices: Sequence[Value],
+        lengths: Sequence[Value],
+        result_type: Type,
+    ) -> Value:
+        source_dims = self.dynamic_dims(source)
+        result_tt = RankedTensorType(result_type)
+        result_dims = [
+            lengths[i] for i in range(result_tt.rank) if result_tt.is_dynamic_dim(i)
+        ]
+        with self.ip, self.loc:
+            return TensorSliceOp.build_generic(
+                results=[result_type],
+                operands=[source, source_dims, start_indices, lengths, result_dims],
+            ).result
+
+    def tensor_update(
+        self, target: Value, start_indices: Sequence[Value], update: Value
+    ) -> Value:
+        target_dims = self.dynamic_dims(target)
+        update_dims = self.dynamic_dims(update)
+        with self.ip, self.loc:
+            return TensorUpdateOp.build_generic(
+                results=[target.type],
+                operands=[target, target_dims, start_indices, update, update_dims],
+            ).result
+
+    def scf_if(self, condition: Value, result_types: Sequence[Type]) -> Operation:
+        """Creates an scf.if with empty then and else blocks.
+
+        Use `insert_into` to populate each block, ending it with `scf_yield`.
+        """
+        with self.ip, self.loc:
+            if_op = Operation.create(
+                "scf.if", results=result_types, operands=[condition], regions=2
+            )
+            if_op.regions[0].blocks.append()
+            if_op.regions[1].blocks.append()
+        return if_op
+
+    def scf_yield(self, *values: Value):
+        with self.ip, self.loc:
+            Operation.create("scf.yield", operands=values)
+
     def ret(self, *values: Value):
         with self.ip, self.loc:
             Operation.create("func.return", operands=values)
@@ -0,0 +1,280 @@
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from iree.compiler.ir import (
+    Attribute,
+    DenseElementsAttr,
+    DenseResourceElementsAttr,
+    F16Type,
+    F32Type,
+    FlatSymbolRefAttr,
+    FloatAttr,
+    InsertionPoint,
+    IntegerAttr,
+    Location,
+    Operation,
+    RankedTensorType,
+    StringAttr,
+    Type,
+    TypeAttr,
+)
+
+from .merge_utils import TopLevelOpIndex, is_global_immutable_initialized, null_logger
+from .resource_utils import get_resource_key, read_resource_blobs
+
+# Compact element types that constants can be converted to, mapped to their
+# numpy dtype and MLIR type class.
+COMPACT_ELEMENT_TYPES = {
+    "f16": (np.float16, F16Type),
+    "f32": (np.float32, F32Type),
+}
+
+# Numpy dtypes for reading resource payloads by MLIR element type.
+NUMPY_ELEMENT_TYPES = {
+    "f64": np.float64,
+    "f32": np.float32,
+    "f16": np.float16,
+    "i8": np.int8,
+    "i16": np.int16,
+    "i32": np.int32,
+    "i64": np.int64,
+}
+
+
+def collect_global_uses(
+    module_op: Operation,
+) -> Tuple[Dict[str, List[Operation]], Set[str]]:
+    """Finds all loads of globals by symbol name and all addressed globals."""
+    loads: Dict[str, List[Operation]] = {}
+    addressed: Set[str] = set()
+
+    def visit(op: Operation):
+        for region in op.regions:
+            for block in region.blocks:
+                for child_view in block.operations:
+                    child = child_view.operation
+                    if child.name == "util.global.load":
+                        sym_name = FlatSymbolRefAttr(child.attributes["global"]).value
+                        loads.setdefault(sym_name, []).append(child)
+                    elif child.name == "util.global.address":
+                        sym_name = FlatSymbolRefAttr(child.attributes["global"]).value
+                        addressed.add(sym_name)
+                    visit(child)
+
+    visit(module_op)
+    return loads, addressed
+
+
+class ConstantCompactor:
+    """Rewrites initialized constant globals into a more compact form.
+
+    Eligible globals are private, immutable, initialized with a dense
+    (inline non-splat or resource) payload and never have their address
+    taken. For each, the payload is:
+      * Converted to `element_type` if it is a wider floating point type and
+        the conversion does not overflow. The largest absolute error must
+        not exceed `max_abs_error`, if given, nor `max_rel_error` times the
+        largest magnitude in the payload, if given. Every load of the global
+        is then followed by an `arith.extf` back to the original type.
+      * Stored as a splat if `splat` and all of its elements are equal.
+    """
+
+    def __init__(
+        self,
+        module_op: Operation,
+        index: TopLevelOpIndex,
+        element_type: Optional[str] = None,
+        *,
+        splat: bool = True,
+        min_bytes: int = 0,
+        max_abs_error: Optional[float] = None,
+        max_rel_error: Optional[float] = 1e-3,
+        logger=None,
+    ):
+        self.module_op = module_op
+        self.index = index
+        self.context = module_op.context
+        self.np_dtype = None
+        self.mlir_type_class = None
+        if element_type is not None:
+            if element_type not in COMPACT_ELEMENT_TYPES:
+                raise ValueError(
+                    f"Unsupported compact element type '{element_type}' "
+                    f"(expected one of {list(COMPACT_ELEMENT_TYPES.keys())})"
+                )
+            self.np_dtype, self.mlir_type_class = COMPACT_ELEMENT_TYPES[element_type]
+        self.splat = splat
+        self.min_bytes = min_bytes
+        self.max_abs_error = max_abs_error
+        self.max_rel_error = max_rel_error
+        self.logger = logger if logger else null_logger
+
+    def run(self) -> Dict[str, int]:
+        """Compacts all eligible globals.
+
+        Returns a map of global name to the number of bytes saved.
+        """
+        loads, addressed = collect_global_uses(self.module_op)
+        # Compacted payloads as (global_op, orig_nbytes, new_array, converted,
+        # splat, resource_key).
+        compacted = []
+        resource_globals: Dict[str, List[Operation]] = {}
+        resource_layouts: Dict[str, Tuple[Any, List[int]]] = {}
+        for global_op in self.index.get("util.global"):
+            if not is_global_immutable_initialized(global_op):
+                continue
+            attrs = global_op.attributes
+            # Loads of public globals may live outside of this module.
+            if (
+                "sym_visibility" not in attrs
+                or StringAttr(attrs["sym_visibility"]).value != "private"
+            ):
+                continue
+            sym_name = StringAttr(attrs["sym_name"]).value
+            if sym_name in addressed:
+                continue
+            value = global_op.attributes["initial_value"]
+            key = get_resource_key(value)
+            if key is not None:
+                t = RankedTensorType(TypeAttr(global_op.attributes["type"]).value)
+                np_dtype = NUMPY_ELEMENT_TYPES.get(str(t.element_type))
+                if np_dtype is None or not t.has_static_shape:
+                    continue
+                resource_globals.setdefault(key, []).append(global_op)
+                resource_layouts[key] = (np_dtype, list(t.shape))
+                continue
+            if not DenseElementsAttr.isinstance(value):
+                continue
+            dense = DenseElementsAttr(value)
+            if dense.is_splat:
+                continue
+            try:
+                array = np.asarray(memoryview(dense))
+            except ValueError:
+                # Element types without a buffer mapping (e.g. i1).
+                continue
+            result = self._compact(array)
+            if result:
+                compacted.append((global_op, array.nbytes, *result, None))
+
+        if resource_globals:
+            resource_results = {}
+
+            def compact_blob(key: str, data: memoryview):
+                # Runs while the module is printed, so only numpy is used here.
+                np_dtype, shape = resource_layouts[key]
+                array = np.frombuffer(data, dtype=np_dtype).reshape(shape)
+                result = self._compact(array)
+                if result:
+                    resource_results[key] = (array.nbytes, *result)
+
+            read_resource_blobs(self.module_op, set(resource_layouts), compact_blob)
+            for key, result in resource_results.items():
+                for global_op in resource_globals[key]:
+                    compacted.append((global_op, *result, key))
+
+        savings: Dict[str, int] = {}
+        new_resource_attrs: Dict[str, Attribute] = {}
+        for global_op, orig_bytes, new_array, converted, splat, key in compacted:
+            sym_name = StringAttr(global_op.attributes["sym_name"]).value
+            orig_type = RankedTensorType(TypeAttr(global_op.attributes["type"]).value)
+            with self.context, Location.unknown():
+                if converted:
+                    element_type = self.mlir_type_class.get()
+                else:
+                    element_type = orig_type.element_type
+                new_type = RankedTensorType.get(orig_type.shape, element_type)
+
+            if splat:
+                new_attr = self._splat_attr(new_type, new_array.reshape(-1)[0])
+                new_bytes = new_array.itemsize
+            elif key is None:
+                new_attr = DenseElementsAttr.get(new_array, context=self.context)
+                new_bytes = new_array.nbytes
+            else:
+                # Globals sharing a resource also share its compacted form.
+                new_attr = new_resource_attrs.get(key)
+                if new_attr is None:
+                    new_attr = DenseResourceElementsAttr.get_from_buffer(
+                        np.ascontiguousarray(new_array),
+                        f"{sym_name}_compact",
+                        new_type,
+                        context=self.context,
+                    )
+                    new_resource_attrs[key] = new_attr
+                new_bytes = new_array.nbytes
+
+            global_op.attributes["initial_value"] = new_attr
+            if converted:
+                global_op.attributes["type"] = TypeAttr.get(
+                    new_type, context=self.context
+                )
+                self._extend_loads(loads.get(sym_name, []), new_type, orig_type)
+            savings[sym_name] = orig_bytes - new_bytes
+            self.logger(
+                f"Compacted global {sym_name}: {orig_bytes} -> {new_bytes} bytes"
+            )
+        return savings
+
+    def _compact(self, array: np.ndarray) -> Optional[Tuple[np.ndarray, bool, bool]]:
+        """Computes the compacted form of a payload.
+
+        Returns (new_array, converted, splat) or None if it cannot be
+        compacted.
+        """
+        if array.size == 0 or array.nbytes < self.min_bytes:
+            return None
+        new_array = self._convert(array)
+        converted = new_array is not array
+        flat = new_array.reshape(-1)
+        splat = self.splat and bool(np.all(flat == flat[0]))
+        if not (converted or splat):
+            return None
+        return new_array, converted, splat
+
+    def _convert(self, array: np.ndarray) -> np.ndarray:
+        if (
+            self.np_dtype is None
+            or array.dtype.kind != "f"
+            or array.dtype.itemsize <= np.dtype(self.np_dtype).itemsize
+        ):
+            return array
+        converted = array.astype(self.np_dtype)
+        # Reject conversions that overflow the compact type.
+        if not np.all(np.isfinite(converted) | ~np.isfinite(array)):
+            return array
+        finite = np.isfinite(array)
+        if not np.any(finite):
+            return converted
+        error = np.max(np.abs(converted.astype(array.dtype) - array)[finite])
+        if self.max_abs_error is not None and not error <= self.max_abs_error:
+            return array
+        if self.max_rel_error is not None:
+            scale = np.max(np.abs(array[finite]))
+            if not error <= self.max_rel_error * scale:
+                return array
+        return converted
+
+    def _splat_attr(self, t: RankedTensorType, value) -> Attribute:
+        with self.context, Location.unknown():
+            if isinstance(value, np.floating):
+                element_attr = FloatAttr.get(t.element_type, float(value))
+            else:
+                element_attr = IntegerAttr.get(t.element_type, int(value))
+            return DenseElementsAttr.get_splat(t, element_attr)
+
+    def _extend_loads(
+        self, load_ops: Sequence[Operation], new_type: Type, orig_type: Type
+    ):
+        for load_op in load_ops:
+            attrs = {named.name: named.attr for named in load_op.attributes}
+            with InsertionPoint(load_op), load_op.location:
+                new_load = Operation.create(
+                    "util.global.load", results=[new_type], attributes=attrs
+                ).result
+                extended = Operation.create(
+                    "arith.extf", results=[orig_type], operands=[new_load]
+                ).result
+            load_op.result.replace_all_uses_with(extended)
+            load_op.erase()
@@ -1,14 +1,32 @@
-from typing import Any, Dict, List, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Set, Union
 
 from iree.compiler.ir import (
     Attribute,
     Block,
     Context,
+    BF16Type,
+    DenseElementsAttr,
+    F16Type,
+    F32Type,
+    F64Type,
+    IndexType,
+    IntegerType,
     Location,
     Module,
     Operation,
+    ShapedType,
     StringAttr,
     SymbolTable,
+    Type,
+    TypeAttr,
+)
+
+# Bit widths of float element types by MLIR type class.
+FLOAT_BITWIDTHS = (
+    (F16Type, 16),
+    (BF16Type, 16),
+    (F32Type, 32),
+    (F64Type, 64),
 )
 
 
@@ -25,6 +43,57 @@ def get_top_level_ops(module_op: Operation, *op_names: str) -> Sequence[Operatio
     return results
 
 
+class TopLevelOpIndex:
+    """Buckets the top-level ops of a module in a single pass.
+
+    Ops are indexed by op name and, for symbol ops, by symbol name. Ops found
+    by the initial scan are in block order, followed by ops in the order they
+    were `add`ed (which need not match their position in the block). The
+    symbol map is only built on first use since it is comparatively expensive
+    for modules with many globals. The index is a snapshot: it is not updated
+    when the module is mutated other than through `add`.
+    """
+
+    def __init__(self, module_op: Operation):
+        self.by_name: Dict[str, List[Operation]] = {}
+        self._by_symbol: Optional[Dict[str, Operation]] = None
+        for op_view in module_op.regions[0].blocks[0]:
+            self.add(op_view.operation)
+
+    @property
+    def by_symbol(self) -> Dict[str, Operation]:
+        if self._by_symbol is None:
+            self._by_symbol = {}
+            for op_list in self.by_name.values():
+                for op in op_list:
+                    self._add_symbol(op)
+        return self._by_symbol
+
+    def add(self, op: Operation):
+        # Callers may pass an OpView (e.g. from `detach_from_parent`), whose
+        # `name` is not necessarily the op name: for a func.func it is the
+        # symbol name.
+        op = op.operation
+        op_list = self.by_name.get(op.name)
+        if op_list is None:
+            op_list = []
+            self.by_name[op.name] = op_list
+        op_list.append(op)
+        if self._by_symbol is not None:
+            self._add_symbol(op)
+
+    def _add_symbol(self, op: Operation):
+        if "sym_name" in op.attributes:
+            sym_name = StringAttr(op.attributes["sym_name"]).value
+            self._by_symbol[sym_name] = op
+
+    def get(self, *op_names: str) -> Sequence[Operation]:
+        results = []
+        for op_name in op_names:
+            results.extend(self.by_name.get(op_name, ()))
+        return results
+
+
 def is_global_immutable_initialized(global_op: Operation):
     return (
         "is_mutable" not in global_op.attributes
@@ -32,7 +101,42 @@ def is_global_immutable_initialized(global_op: Operation):
     )
 
 
-def uniqueify_name(local_name: str, st: SymbolTable) -> str:
+def get_element_bitwidth(t: Type) -> int:
+    """Gets the bit width of an element type, or 0 if it is not known."""
+    if IntegerType.isinstance(t):
+        return IntegerType(t).width
+    if IndexType.isinstance(t):
+        # Index storage is target dependent: assume 64 bits.
+        return 64
+    for type_class, bitwidth in FLOAT_BITWIDTHS:
+        if type_class.isinstance(t):
+            return bitwidth
+    return 0
+
+
+def estimate_global_bytes(global_op: Operation) -> int:
+    """Estimates the storage size of an initialized global's payload.
+
+    Returns 0 for payloads of unknown size (non static shapes or element
+    types without a known bit width).
+    """
+    t = TypeAttr(global_op.attributes["type"]).value
+    if not ShapedType.isinstance(t):
+        return 0
+    st = ShapedType(t)
+    if not st.has_static_shape:
+        return 0
+    bitwidth = get_element_bitwidth(st.element_type)
+    value = global_op.attributes["initial_value"]
+    num_elements = 1
+    if not (DenseElementsAttr.isinstance(value) and DenseElementsAttr(value).is_splat):
+        for dim in st.shape:
+            num_elements *= dim
+    # Sub-byte element types (e.g. i4) are packed.
+    return (num_elements * bitwidth + 7) // 8
+
+
+def uniqueify_name(local_name: str, st: Union[SymbolTable, Set[str]]) -> str:
     index = -1
     while True:
         index += 1
@@ -43,6 +147,33 @@ def uniqueify_name(local_name: str, st: SymbolTable) -> str:
             return full_name
 
 
+class MergePlan:
+    """Result of a dry run merge (see `Merger.plan`).
+
+    Symbol names are plain strings. The `rename_map` includes both aliased
+    globals and imported symbols that will be renamed. Any `conflicts` will
+    cause the merge to fail.
+    """
+
+    def __init__(self):
+        self.rename_map: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        self.imported_symbols: List[str] = []
+        self.conflicts: List[str] = []
+        self.unused_user_renames: List[str] = []
+        self.imported_bytes = 0
+        self.deduplicated_bytes = 0
+
+    def __repr__(self):
+        return (
+            f"MergePlan(imported={len(self.imported_symbols)}, "
+            f"aliased={len(self.aliases)}, renamed={len(self.rename_map)}, "
+            f"conflicts={len(self.conflicts)}, "
+            f"imported_bytes={self.imported_bytes}, "
+            f"deduplicated_bytes={self.deduplicated_bytes})"
+        )
+
+
 class Merger:
     def __init__(
         self,
@@ -50,6 +181,8 @@ class Merger:
         target_module: Operation,
         user_rename_map: Dict[str, str],
         *,
+        source_index: Optional[TopLevelOpIndex] = None,
+        target_index: Optional[TopLevelOpIndex] = None,
         logger=None,
     ):
         self.context = source_module.context
@@ -66,8 +199,19 @@ class Merger:
 
         # Map of value attributes to global operation.
         self.initialized_globals: Dict[Attribute, Operation] = {}
-        target_globals = get_top_level_ops(self.target_module, "util.global")
-        for global_op in target_globals:
+        # The target index is kept up to date with imported ops, while the
+        # source index is stale once the merge has run.
+        self.source_index = (
+            source_index
+            if source_index is not None
+            else TopLevelOpIndex(self.source_module)
+        )
+        self.target_index = (
+            target_index
+            if target_index is not None
+            else TopLevelOpIndex(self.target_module)
+        )
+        for global_op in self.target_index.get("util.global"):
             if not is_global_immutable_initialized(global_op):
                 continue
             self.initialized_globals[global_op.attributes["initial_value"]] = global_op
@@ -76,10 +220,72 @@ class Merger:
     def target_body(self) -> Block:
         return self.target_module.regions[0].blocks[0]
 
+    def plan(self) -> MergePlan:
+        """Computes the outcome of `merge` without mutating either module."""
+        plan = MergePlan()
+        symbols = set(self.target_index.by_symbol.keys())
+        source_index = self.source_index
+
+        for global_op in source_index.get("util.global"):
+            sym_name = StringAttr(SymbolTable.get_symbol_name(global_op)).value
+            if is_global_immutable_initialized(global_op):
+                global_bytes = estimate_global_bytes(global_op)
+                global_value = global_op.attributes["initial_value"]
+                alias_global_op = self.initialized_globals.get(global_value)
+                if alias_global_op:
+                    alias_to = StringAttr(
+                        SymbolTable.get_symbol_name(alias_global_op)
+                    ).value
+                    plan.aliases[sym_name] = alias_to
+                    if alias_to != sym_name:
+                        plan.rename_map[sym_name] = alias_to
+                    plan.deduplicated_bytes += global_bytes
+                    continue
+                plan.imported_bytes += global_bytes
+            self._plan_import(sym_name, symbols, plan)
+
+        for func_op in source_index.get("func.func"):
+            sym_name = StringAttr(SymbolTable.get_symbol_name(func_op)).value
+            self._plan_import(sym_name, symbols, plan)
+
+        plan.unused_user_renames = [
+            name
+            for name in self.user_rename_map
+            if name not in self.source_symbol_table
+        ]
+        return plan
+
+    def _plan_import(self, sym_name: str, symbols: Set[str], plan: MergePlan):
+        requested_symbol = self.user_rename_map.get(sym_name)
+        if requested_symbol:
+            if requested_symbol in symbols:
+                plan.conflicts.append(
+                    f"Requested symbol rename {requested_symbol} exists in the target"
+                )
+                # Continue planning as if the conflict were implicitly renamed.
+                new_symbol_name = uniqueify_name(requested_symbol, symbols)
+            else:
+                new_symbol_name = requested_symbol
+        else:
+            new_symbol_name = uniqueify_name(sym_name, symbols)
+        symbols.add(new_symbol_name)
+        if new_symbol_name != sym_name:
+            plan.rename_map[sym_name] = new_symbol_name
+        plan.imported_symbols.append(new_symbol_name)
+
     def merge(self):
+        # Reject conflicting user renames before anything is detached from
+        # the source. Only a full simulation of the import order catches
+        # renames that collide with source symbols imported under their own
+        # names.
+        conflicts = self.plan().conflicts
+        if conflicts:
+            raise ValueError("; ".join(conflicts))
+
+        source_index = self.source_index
+
         # Merge globals.
-        source_globals = get_top_level_ops(self.source_module, "util.global")
-        for global_op in source_globals:
+        for global_op in source_index.get("util.global"):
             if not is_global_immutable_initialized(global_op):
                 self.import_symbol_op(global_op)
                 continue
@@ -98,15 +304,14 @@ class Merger:
                 self.import_symbol_op(global_op)
 
         # Merge initializers.
-        initializers = get_top_level_ops(self.source_module, "util.initializer")
-        for init_op in initializers:
+        for init_op in source_index.get("util.initializer"):
             init_op.detach_from_parent()
             self.nested_symbol_table_ops.append(init_op)
             self.target_body.append(init_op)
+            self.target_index.add(init_op)
 
         # Merge functions.
-        funcs = get_top_level_ops(self.source_module, "func.func")
-        for func_op in funcs:
+        for func_op in source_index.get("func.func"):
             self.import_symbol_op(func_op)
             self.nested_symbol_table_ops.append(func_op)
 
@@ -146,6 +351,7 @@ class Merger:
         self.target_body.append(symbol_op)
         self.nested_symbol_ops.append(symbol_op)
         self.target_symbol_table.insert(symbol_op)
+        self.target_index.add(symbol_op)
 
     def _rename(self, from_symbol, to_symbol):
         from_symbol = self._make_string_attr(from_symbol)
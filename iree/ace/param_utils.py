@@ -0,0 +1,125 @@
+from typing import Any, Dict, List, Optional, Sequence, Union
+from pathlib import Path
+import hashlib
+
+from iree.compiler.ir import (
+    Attribute,
+    DenseElementsAttr,
+    Operation,
+    Type,
+    TypeAttr,
+)
+
+from .resource_utils import get_resource_key, read_resource_blobs
+
+
+class ParameterStore:
+    """Content-addressed store of global initial values.
+
+    A store can be shared by every output of a workspace: identical payloads
+    are keyed by the same digest and are only written once when the store is
+    saved as a parameter archive. Modules reference stored payloads as
+    `#stream.parameter.named<"scope"::"digest">` attributes.
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+        # Payloads are either inline DenseElementsAttrs or the data of
+        # dense resource blobs.
+        self.blobs: Dict[str, Union[DenseElementsAttr, memoryview]] = {}
+        # Total size of all payloads that have been externalized, including
+        # duplicates.
+        self.referenced_bytes = 0
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(memoryview(blob).nbytes for blob in self.blobs.values())
+
+    def intern(self, type_asm: str, blob: Union[DenseElementsAttr, memoryview]) -> str:
+        """Adds a payload of the given type to the store and returns its digest."""
+        data = memoryview(blob)
+        h = hashlib.sha256(type_asm.encode())
+        h.update(data)
+        digest = h.hexdigest()
+        self.blobs.setdefault(digest, blob)
+        self.referenced_bytes += data.nbytes
+        return digest
+
+    def parameter_attr(self, digest: str, t: Type) -> Attribute:
+        return Attribute.parse(
+            f'#stream.parameter.named<"{self.scope}"::"{digest}"> : {t}',
+            context=t.context,
+        )
+
+    def externalize(self, value: Attribute) -> Optional[Attribute]:
+        """Interns an inline initial value and returns a parameter reference.
+
+        Returns None if the value is not eligible to be stored (i.e. it is
+        not a dense, non-splat payload that can be accessed as a buffer).
+        """
+        if not DenseElementsAttr.isinstance(value):
+            return None
+        dense = DenseElementsAttr(value)
+        if dense.is_splat:
+            return None
+        try:
+            memoryview(dense)
+        except ValueError:
+            return None
+        digest = self.intern(str(dense.type), dense)
+        return self.parameter_attr(digest, dense.type)
+
+    def externalize_globals(
+        self, module_op: Operation, global_ops: Sequence[Operation]
+    ) -> int:
+        """Externalizes the initial values of globals in `module_op`.
+
+        Both inline dense payloads and dense resource blobs are interned. The
+        globals must be immutable and initialized. Returns the number of
+        globals that were rewritten.
+        """
+        count = 0
+        resource_globals: Dict[str, List[Operation]] = {}
+        for global_op in global_ops:
+            value = global_op.attributes["initial_value"]
+            key = get_resource_key(value)
+            if key is not None:
+                resource_globals.setdefault(key, []).append(global_op)
+                continue
+            param_attr = self.externalize(value)
+            if param_attr is None:
+                continue
+            global_op.attributes["initial_value"] = param_attr
+            count += 1
+
+        if not resource_globals:
+            return count
+        # The blob reader callback must not touch the IR, so only collect the
+        # data and intern it afterwards.
+        resource_data: Dict[str, memoryview] = {}
+
+        def collect(key: str, data: memoryview):
+            resource_data[key] = data
+
+        read_resource_blobs(module_op, set(resource_globals.keys()), collect)
+        for key, data in resource_data.items():
+            for global_op in resource_globals[key]:
+                t = TypeAttr(global_op.attributes["type"]).value
+                digest = self.intern(str(t), data)
+                global_op.attributes["initial_value"] = self.parameter_attr(digest, t)
+                count += 1
+        return count
+
+    def save(self, path: Union[str, Path]):
+        """Writes each unique payload once to an IREE parameter archive."""
+        try:
+            from iree.runtime import ParameterIndex
+        except ImportError as e:
+            raise RuntimeError(
+                "Saving parameters requires the iree-runtime package "
+                "(pip install shark-ace[runtime])"
+            ) from e
+        index = ParameterIndex()
+        for digest, blob in self.blobs.items():
+            index.add_buffer(digest, memoryview(blob))
+        index.create_archive_file(str(path))
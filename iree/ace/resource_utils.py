@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+import re
+
+from iree.compiler.ir import (
+    Attribute,
+    DenseResourceElementsAttr,
+    Operation,
+)
+
+# Matches the printed form of a dense resource attribute to extract its key.
+RESOURCE_ATTR_RE = re.compile(r"^dense_resource<(.+)>\s*:")
+
+# Matches a blob entry in the dialect_resources section of printed asm.
+RESOURCE_BLOB_RE = re.compile(
+    r'^\s*("(?:[^"\\]|\\.)*"|[^\s:]+)\s*:\s*"0x([0-9A-Fa-f]*)",?\s*$'
+)
+
+
+def get_resource_key(value: Attribute) -> Optional[str]:
+    """Gets the key of a dense resource attribute as printed in asm.
+
+    Returns None if the attribute is not a dense resource.
+    """
+    if not DenseResourceElementsAttr.isinstance(value):
+        return None
+    m = RESOURCE_ATTR_RE.match(str(value))
+    return m.group(1) if m else None
+
+
+def read_resource_blobs(
+    module_op: Operation,
+    keys: Set[str],
+    callback: Callable[[str, memoryview], None],
+):
+    """Invokes `callback(key, data)` with the contents of resource blobs.
+
+    The Python API has no accessor for the data of a dense resource, so the
+    module is printed and the blobs are recovered from its resource section.
+    The asm is streamed a line at a time, so only one blob is held in memory
+    at once. The callback must not access or mutate the IR: it runs while
+    the module is being printed.
+    """
+    reader = _ResourceBlobReader(keys, callback)
+    module_op.print(file=reader)
+    reader.close()
+
+
+class _ResourceBlobReader:
+    """File-like sink for module asm that extracts resource blobs."""
+
+    def __init__(self, keys: Set[str], callback: Callable[[str, memoryview], None]):
+        self.keys = keys
+        self.callback = callback
+        self.in_resources = False
+        self.chunks: List[str] = []
+
+    def write(self, text: str):
+        self.chunks.append(text)
+        if "\n" not in text:
+            return
+        *lines, rest = "".join(self.chunks).split("\n")
+        self.chunks = [rest]
+        for line in lines:
+            self._process_line(line)
+
+    def close(self):
+        self._process_line("".join(self.chunks))
+        self.chunks = []
+
+    def _process_line(self, line: str):
+        if not self.in_resources:
+            self.in_resources = line.startswith("{-#")
+            return
+        m = RESOURCE_BLOB_RE.match(line)
+        if not m or m.group(1) not in self.keys:
+            return
+        # Blobs are printed with a leading 32bit alignment.
+        data = memoryview(bytes.fromhex(m.group(2)))[4:]
+        self.callback(m.group(1), data)
@@ -1,9 +1,14 @@
 """Primary interactive API for manipulating artifacts."""
 
-from typing import Any, Dict, List, Sequence, Union
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import asyncio
+import contextlib
+import functools
 import re
 import time
+import warnings
 
 from iree.compiler.api import (
     Session,
@@ -25,31 +30,54 @@ from iree.compiler.ir import (
     TypeAttr,
 )
 
+from . import batch_utils
 from . import builder
+from . import const_utils
 from . import merge_utils
+from . import param_utils
 
 __all__ = [
     "InputModule",
+    "ProgressEvent",
     "Workspace",
 ]
 
 
 class Workspace:
-    """Workspace for artifacts."""
-
-    def __init__(self):
+    """Workspace for artifacts.
+
+    If a `parameter_scope` is given, the workspace keeps a content-addressed
+    parameter store that outputs can externalize their constants to (see
+    `ModuleTransforms.externalize_parameters`). Constants shared between
+    outputs are then only saved once by `save_parameters`.
+
+    Progress is reported as `ProgressEvent`s to each of the
+    `progress_listeners`, which by default prints them. Long running
+    operations have `*_async` counterparts that run on a single worker thread
+    per workspace, so several workspaces can be driven concurrently from one
+    event loop. Use the workspace as an async context manager (or call
+    `close`) to release the worker thread.
+    """
+
+    def __init__(self, *, parameter_scope: Optional[str] = None):
         self.session = Session()
         self.context = self.session.context
         self.inputs: Dict[str, "InputModule"] = AttrDict()
         self.outputs: Dict[str, "OutputModule"] = AttrDict()
+        self.parameters: Optional[param_utils.ParameterStore] = None
+        if parameter_scope is not None:
+            self.parameters = param_utils.ParameterStore(parameter_scope)
+        self.progress_listeners: List[Callable[["ProgressEvent"], None]] = [
+            PrintProgress()
+        ]
+        self._executor: Optional[ThreadPoolExecutor] = None
 
     def open_input(
         self, path: Union[str, Path], ident: str = "input0"
     ) -> "InputModule":
         inv = self.session.invocation()
         ident = self.inputs._reserve(ident)
-        t = report_start(f"Opening file {path} as {ident}...")
-        try:
+        with self._report_task(f"Opening file {path} as {ident}...", ident=ident):
             source = Source.open_file(self.session, str(path))
             if not inv.parse_source(source):
                 raise RuntimeError(f"see diagnostics")
@@ -57,11 +85,11 @@ class Workspace:
             input = InputModule(self, ident, inv, module)
             self.inputs[ident] = input
             return input
-        except Exception as e:
-            report_end(f"ERROR: {e}")
-            raise e
-        finally:
-            report_end(f" complete in {t.elapsed}")
+
+    async def open_input_async(
+        self, path: Union[str, Path], ident: str = "input0"
+    ) -> "InputModule":
+        return await self._run_async(self.open_input, path, ident)
 
     def create_empty(self, ident: str = "output0") -> "OutputModule":
         inv = self.session.invocation()
@@ -73,6 +101,109 @@ class Workspace:
         self.outputs[ident] = output
         return output
 
+    def save_parameters(self, path: Union[str, Path]):
+        """Saves the deduplicated parameter store as a parameter archive."""
+        if self.parameters is None:
+            raise ValueError("Workspace was not created with a parameter_scope")
+        with self._report_task(
+            f"Saving {len(self.parameters.blobs)} parameters to {path}..."
+        ):
+            self.parameters.save(path)
+
+    async def save_parameters_async(self, path: Union[str, Path]):
+        await self._run_async(self.save_parameters, path)
+
+    def close(self):
+        """Releases the worker thread used by the async APIs."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self) -> "Workspace":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Shutting down waits for pending work, so don't block the loop on it.
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def subscribe(
+        self, listener: Callable[["ProgressEvent"], None]
+    ) -> Callable[[], None]:
+        """Adds a progress listener and returns a function that removes it."""
+        self.progress_listeners.append(listener)
+
+        def unsubscribe():
+            if listener in self.progress_listeners:
+                self.progress_listeners.remove(listener)
+
+        return unsubscribe
+
+    @contextlib.contextmanager
+    def progress_queue(self):
+        """Subscribes an asyncio queue to progress events for a scope.
+
+        Must be entered from the event loop that consumes the queue. Events
+        emitted from the worker thread are delivered thread-safely:
+
+          with ws.progress_queue() as events:
+              task = asyncio.create_task(ws.open_input_async(path))
+              ...
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[ProgressEvent]" = asyncio.Queue()
+
+        def listener(event: ProgressEvent):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        unsubscribe = self.subscribe(listener)
+        try:
+            yield queue
+        finally:
+            unsubscribe()
+
+    def _report(self, message: str, *, ident: Optional[str] = None):
+        self._emit(ProgressEvent("message", message, ident=ident))
+
+    @contextlib.contextmanager
+    def _report_task(self, message: str, *, ident: Optional[str] = None):
+        t = Timer()
+        self._emit(ProgressEvent("start", message, ident=ident))
+        try:
+            yield
+        except Exception as e:
+            self._emit(
+                ProgressEvent(
+                    "error", message, ident=ident, elapsed_s=t.elapsed_s, error=str(e)
+                )
+            )
+            raise
+        else:
+            self._emit(
+                ProgressEvent("end", message, ident=ident, elapsed_s=t.elapsed_s)
+            )
+
+    def _emit(self, event: "ProgressEvent"):
+        # Listeners may be removed from another thread while emitting, and a
+        # failing listener must not fail the work being reported on.
+        for listener in list(self.progress_listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                warnings.warn(f"Progress listener {listener!r} failed: {e}")
+
+    async def _run_async(self, f: Callable, *args, **kwargs):
+        # The IR of a workspace is not safe to mutate concurrently, so all
+        # async work for a workspace is serialized on one worker thread.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="iree-ace"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(f, *args, **kwargs)
+        )
+
     def _resolve_output(self, output: Union[str, "OutputModule"]) -> "OutputModule":
         if isinstance(output, OutputModule):
             return output
@@ -92,23 +223,35 @@ class WorkspaceModule:
         self.ident = ident
         self.inv = inv
         self.module = module
+        self._top_level_ops: Optional[merge_utils.TopLevelOpIndex] = None
 
     @property
     def builder(self) -> builder.Builder:
-        return builder.Builder(self.module)
+        return builder.Builder(self.module, self.top_level_ops)
 
     @property
     def body(self) -> Block:
         return self.module.regions[0].blocks[0]
 
+    @property
+    def top_level_ops(self) -> merge_utils.TopLevelOpIndex:
+        """Index of the top-level ops by op name and symbol name.
+
+        The index is cached and shared by the workspace APIs, which keep it
+        current or invalidate it as they mutate the module. Call
+        `invalidate_top_level_ops` after mutating the module by other means.
+        """
+        if self._top_level_ops is None:
+            self._top_level_ops = merge_utils.TopLevelOpIndex(self.module)
+        return self._top_level_ops
+
+    def invalidate_top_level_ops(self):
+        self._top_level_ops = None
+
     @property
     def functions(self) -> Dict[str, "FunctionInfo"]:
         results = {}
-        for op_view in self.body:
-            op = op_view.operation
-            op_name = op.name
-            if op_name not in ["func.func"]:
-                continue
+        for op in self.top_level_ops.get("func.func"):
             func_name = StringAttr(SymbolTable.get_symbol_name(op)).value
             results[func_name] = FunctionInfo(op)
         return results
@@ -116,14 +259,9 @@ class WorkspaceModule:
     @property
     def public_functions(self) -> Dict[str, "FunctionInfo"]:
         results = {}
-        for op_view in self.body:
-            op = op_view.operation
-            op_name = op.name
-            if op_name not in ["func.func"]:
-                continue
+        for op in self.top_level_ops.get("func.func"):
             try:
                 vis = str(SymbolTable.get_visibility(op))
-                print(vis)
             except ValueError:
                 vis = "public"
             if vis != "public":
@@ -135,11 +273,49 @@ class WorkspaceModule:
     def merge_to(self, output: Union[str, "OutputModule"], symbol_map: Dict[str, str]):
         """Destructively merges this module into the given OutputModule."""
         output = self.workspace._resolve_output(output)
+        with self.workspace._report_task(
+            f"Merging {self.ident} into {output.ident}...", ident=self.ident
+        ):
+            merger = merge_utils.Merger(
+                self.module,
+                output.module,
+                symbol_map,
+                source_index=self.top_level_ops,
+                target_index=output.top_level_ops,
+                logger=functools.partial(self.workspace._report, ident=self.ident),
+            )
+            # Ops are detached from the source as the merge proceeds, and the
+            # target index may be partially updated if it fails.
+            self.invalidate_top_level_ops()
+            try:
+                merger.merge()
+            except Exception:
+                output.invalidate_top_level_ops()
+                raise
+            output.module.verify()
+
+    def plan_merge_to(
+        self, output: Union[str, "OutputModule"], symbol_map: Dict[str, str]
+    ) -> merge_utils.MergePlan:
+        """Plans `merge_to` without modifying either module."""
+        output = self.workspace._resolve_output(output)
         merger = merge_utils.Merger(
-            self.module, output.module, symbol_map, logger=report
+            self.module,
+            output.module,
+            symbol_map,
+            source_index=self.top_level_ops,
+            target_index=output.top_level_ops,
         )
-        merger.merge()
-        output.module.verify()
+        plan = merger.plan()
+        self.workspace._report(
+            f"Merge plan {self.ident} -> {output.ident}: {plan}", ident=self.ident
+        )
+        return plan
+
+    async def merge_to_async(
+        self, output: Union[str, "OutputModule"], symbol_map: Dict[str, str]
+    ):
+        await self.workspace._run_async(self.merge_to, output, symbol_map)
 
 
 class InputModule(WorkspaceModule):
@@ -169,9 +345,48 @@ class OutputModule(WorkspaceModule):
 
 
 class ModuleTransforms:
+    # Transforms that can be run by name and take no arguments.
+    NAMED_TRANSFORMS = (
+        "normalize_constants",
+        "inline",
+        "cse",
+        "compact_constants",
+        "externalize_parameters",
+    )
+
     def __init__(self, wm: WorkspaceModule):
         self.wm = wm
 
+    def run(self, *transforms: Union[str, Callable[[], Any]]) -> List[Any]:
+        """Runs transforms in order, returning their results.
+
+        Each transform is either the name of one of `NAMED_TRANSFORMS` or a
+        callable taking no arguments, which allows passing arguments, e.g.:
+          functools.partial(module.transforms.compact_constants, "f16")
+        """
+        fs = [self._resolve_transform(t) for t in transforms]
+        results = []
+        for f in fs:
+            with self.wm.workspace._report_task(
+                f"Running {_callable_name(f)} on {self.wm.ident}...",
+                ident=self.wm.ident,
+            ):
+                results.append(f())
+        return results
+
+    async def run_async(self, *transforms: Union[str, Callable[[], Any]]) -> List[Any]:
+        return await self.wm.workspace._run_async(self.run, *transforms)
+
+    def _resolve_transform(self, transform: Union[str, Callable[[], Any]]):
+        if callable(transform):
+            return transform
+        if transform not in self.NAMED_TRANSFORMS:
+            raise ValueError(
+                f"Unknown transform '{transform}' (expected one of "
+                f"{list(self.NAMED_TRANSFORMS)} or a callable)"
+            )
+        return getattr(self, transform)
+
     def normalize_constants(self):
         """Normalizes any eligible constants in the program to globals.
 
@@ -181,15 +396,118 @@ class ModuleTransforms:
         constants.
         """
         # We first make sure to legalize any foreign dialect globals.
-        self.wm.inv.execute_text_pass_pipeline(
+        self._execute_pipeline(
             "iree-import-public, iree-import-ml-program, iree-util-outline-constants, symbol-dce"
         )
 
     def inline(self):
-        self.wm.inv.execute_text_pass_pipeline("inline")
+        self._execute_pipeline("inline")
 
     def cse(self):
-        self.wm.inv.execute_text_pass_pipeline("cse, canonicalize")
+        self._execute_pipeline("cse, canonicalize")
+
+    def _execute_pipeline(self, pipeline: str):
+        # Passes can add, remove and rename arbitrary top-level ops.
+        self.wm.invalidate_top_level_ops()
+        self.wm.inv.execute_text_pass_pipeline(pipeline)
+
+    def compact_constants(
+        self,
+        element_type: Optional[str] = None,
+        *,
+        splat: bool = True,
+        min_bytes: int = 0,
+        max_abs_error: Optional[float] = None,
+        max_rel_error: Optional[float] = 1e-3,
+    ) -> Dict[str, int]:
+        """Stores initialized constant globals in a more compact form.
+
+        Floating point payloads wider than `element_type` (e.g. "f16") are
+        converted to it and extended back to their original type at each
+        load, provided the largest error stays within `max_abs_error` and
+        `max_rel_error` (relative to the largest magnitude in the payload).
+        Payloads whose elements are all equal are stored as splats. Only
+        private globals are compacted. Returns the number of bytes saved per
+        compacted global.
+        """
+        compactor = const_utils.ConstantCompactor(
+            self.wm.module,
+            self.wm.top_level_ops,
+            element_type,
+            splat=splat,
+            min_bytes=min_bytes,
+            max_abs_error=max_abs_error,
+            max_rel_error=max_rel_error,
+            logger=functools.partial(self.wm.workspace._report, ident=self.wm.ident),
+        )
+        savings = compactor.run()
+        self.wm.module.verify()
+        self.wm.workspace._report(
+            f"Compacted {len(savings)} globals saving {sum(savings.values())} bytes",
+            ident=self.wm.ident,
+        )
+        return savings
+
+    def externalize_parameters(self):
+        """Moves constant global payloads into the workspace parameter store.
+
+        Immutable initialized globals with dense (inline or resource) payloads
+        are interned by content digest and rewritten to reference the stored
+        parameter. This is typically run on each output after merging so that
+        payloads shared across outputs are stored once.
+        """
+        store = self.wm.workspace.parameters
+        if store is None:
+            raise ValueError("Workspace was not created with a parameter_scope")
+        global_ops = [
+            global_op
+            for global_op in self.wm.top_level_ops.get("util.global")
+            if merge_utils.is_global_immutable_initialized(global_op)
+        ]
+        count = store.externalize_globals(self.wm.module, global_ops)
+        self.wm.workspace._report(
+            f"Externalized {count} globals: {store.stored_bytes} unique bytes of "
+            f"{store.referenced_bytes} referenced across the workspace",
+            ident=self.wm.ident,
+        )
+
+    def batch_step(
+        self,
+        step: str,
+        name: str,
+        *,
+        batch_size: int,
+        context_size: int,
+        num_inputs: int = 1,
+        num_results: int = 1,
+    ) -> "FunctionInfo":
+        """Defines a public entry that advances `batch_size` sequences per call.
+
+        The `step` function is expected to take `num_inputs` inputs followed by
+        its states and return `num_results` results followed by the updated
+        states, all with a leading unit batch dimension (e.g. state shapes like
+        `1x32x?x128`). States are kept in globals of `batch_size` slots with
+        the dynamic sequence dimension fixed to `context_size`, and each slot
+        keeps its own step count. The entry takes an extra `tensor<Bxi1>` mask
+        of active slots and returns an extra mask of the slots that advanced
+        (inactive slots and slots whose context is full do not). The step
+        function is called once per advanced slot; its body is not re-batched.
+        A `{name}_reset(slot)` function is also defined for restarting a slot.
+        """
+        step_f = self.wm.functions[step]
+        batcher = batch_utils.StepBatcher(
+            self.wm.module,
+            self.wm.top_level_ops,
+            step_f.op,
+            batch_size,
+            context_size,
+            num_inputs=num_inputs,
+            num_results=num_results,
+            logger=functools.partial(self.wm.workspace._report, ident=self.wm.ident),
+        )
+        batched_op = batcher.batch(name)
+        self.wm.module.verify()
+        return FunctionInfo(batched_op)
 
 
 class FunctionInfo:
@@ -221,6 +539,12 @@ class FunctionInfo:
         return f"Function(@{SymbolTable.get_symbol_name(self.op)})"
 
 
+def _callable_name(f: Callable) -> str:
+    while isinstance(f, functools.partial):
+        f = f.func
+    return getattr(f, "__name__", repr(f))
+
+
 class AttrDict(dict):
     def __getattr__(self, key: str) -> Any:
         try:
@@ -254,24 +578,86 @@ class Timer:
 
     @property
     def elapsed(self) -> str:
-        t = self.elapsed_s
-        if t > 1.0:
-            t = int(t * 1000.0) / 1000.0
-            return f"{t}s"
-        if t >= 0.001:
-            return f"{int(t * 1000)}ms"
-        if t >= 0.000001:
-            return f"{int(t * 1000000)}us"
+        return format_elapsed(self.elapsed_s)
+
+
+class ProgressEvent:
+    """Structured progress event emitted by a Workspace.
+
+    The `kind` is one of:
+      "start": a task described by `message` has started.
+      "end": the task has completed after `elapsed_s` seconds.
+      "error": the task failed after `elapsed_s` seconds with `error`.
+      "message": an informational message outside of task bracketing.
+    The `ident` names the module the event concerns, if any.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        message: str,
+        *,
+        ident: Optional[str] = None,
+        elapsed_s: Optional[float] = None,
+        error: Optional[str] = None,
+    ):
+        self.kind = kind
+        self.message = message
+        self.ident = ident
+        self.elapsed_s = elapsed_s
+        self.error = error
+
+    def __repr__(self):
+        return f"ProgressEvent({self.kind}, {self.ident}, {self.message!r})"
+
+
+def format_elapsed(t: float) -> str:
+    if t > 1.0:
+        t = int(t * 1000.0) / 1000.0
         return f"{t}s"
+    if t >= 0.001:
+        return f"{int(t * 1000)}ms"
+    if t >= 0.000001:
+        return f"{int(t * 1000000)}us"
+    return f"{t}s"
+
+
+class PrintProgress:
+    """Default progress listener which prints events as they arrive."""
+
+    def __init__(self):
+        # Whether a start line is waiting for its completion to be printed.
+        self.line_open = False
+
+    def __call__(self, event: ProgressEvent):
+        if event.kind == "start":
+            self._close_line()
+            report_start(event.message)
+            self.line_open = True
+        elif event.kind in ("end", "error"):
+            if not self.line_open:
+                report_start(event.message)
+            if event.kind == "end":
+                report_end(f" complete in {format_elapsed(event.elapsed_s)}")
+            else:
+                report_end(f" ERROR: {event.error}")
+            self.line_open = False
+        else:
+            self._close_line()
+            report(event.message)
+
+    def _close_line(self):
+        if self.line_open:
+            print()
+            self.line_open = False
 
 
 def report(message: str):
     print(":", message)
 
 
-def report_start(message: str) -> Timer:
+def report_start(message: str):
     print(":", message, flush=True, end="")
-    return Timer()
 
 
 def report_end(message: str):
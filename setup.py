@@ -11,5 +11,8 @@ setup(
         "numpy",
     ],
     extras_require={
+        "runtime": [
+            "iree-runtime",
+        ],
     },
 )
\ No newline at end of file
@@ -134,6 +134,11 @@ def define_step_function():
 
 define_step_function()
 
+# Batched variant serving several independent sequences per call.
+out.transforms.batch_step(
+    "step_impl", "step_batched", batch_size=4, context_size=state_context_size
+)
+
 # print("MERGE 2:")
 # second.merge_to(
 #     "output0",
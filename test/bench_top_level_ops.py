@@ -0,0 +1,53 @@
+"""Micro-benchmark of top-level op scanning vs the bucketed op index.
+
+Mirrors the access pattern of a merge: one scan of the target for globals and
+three scans of the source for globals, initializers and functions.
+"""
+
+from iree.ace.merge_utils import TopLevelOpIndex, get_top_level_ops
+from iree.ace.workspace import Timer
+from iree.compiler.ir import Context, Module
+
+num_globals = 20000
+num_funcs = 100
+iterations = 5
+
+
+def make_module_asm() -> str:
+    lines = ["module {"]
+    for i in range(num_globals):
+        lines.append(
+            f"  util.global private @__constant_{i} = dense<{i}> : tensor<4xi32>"
+        )
+    for i in range(num_funcs):
+        lines.append(f"  func.func private @f{i}() {{ return }}")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def scan_merge_pattern(module_op):
+    get_top_level_ops(module_op, "util.global")
+    get_top_level_ops(module_op, "util.global")
+    get_top_level_ops(module_op, "util.initializer")
+    get_top_level_ops(module_op, "func.func")
+
+
+def index_merge_pattern(module_op):
+    index = TopLevelOpIndex(module_op)
+    index.get("util.global")
+    index.get("util.global")
+    index.get("util.initializer")
+    index.get("func.func")
+
+
+with Context() as context:
+    context.allow_unregistered_dialects = True
+    module_op = Module.parse(make_module_asm()).operation
+    for label, f in [
+        ("get_top_level_ops", scan_merge_pattern),
+        ("TopLevelOpIndex", index_merge_pattern),
+    ]:
+        t = Timer()
+        for _ in range(iterations):
+            f(module_op)
+        print(f"{label}: {t.elapsed_s / iterations * 1000.0:.1f}ms per merge")
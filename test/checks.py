@@ -0,0 +1,126 @@
+"""Self-contained checks of workspace operations on small modules.
+
+Unlike basic.py, this needs no external model files:
+  python test/checks.py
+"""
+
+from pathlib import Path
+import tempfile
+
+from iree.ace import *
+
+SOURCE_ASM = """
+module {
+  util.global private @w = dense<[1.0, 2.0, 3.0, 4.0]> : tensor<4xf32>
+  func.func @forward(%arg0: tensor<4xf32>) -> tensor<4xf32> {
+    %0 = util.global.load @w : tensor<4xf32>
+    %1 = arith.addf %arg0, %0 : tensor<4xf32>
+    return %1 : tensor<4xf32>
+  }
+}
+"""
+
+
+def open_asm(ws: Workspace, asm: str, ident: str) -> "InputModule":
+    path = Path(tmp_dir) / f"{ident}.mlir"
+    path.write_text(asm)
+    return ws.open_input(path, ident)
+
+
+def check_merge_functions():
+    ws = Workspace()
+    source = open_asm(ws, SOURCE_ASM, "source")
+    out = ws.create_empty()
+    source.merge_to("output0", {"forward": "step_impl"})
+    assert list(out.functions.keys()) == ["step_impl"], out.functions
+    assert "forward" not in source.functions
+
+
+PLAN_ASM = """
+module {
+  util.global private @w = dense<[1.0, 2.0, 3.0, 4.0]> : tensor<4xf32>
+  util.global private @q = dense<[1, 2, 3, 4]> : tensor<4xi4>
+  func.func @forward(%arg0: tensor<4xf32>) -> tensor<4xf32> {
+    %0 = util.global.load @w : tensor<4xf32>
+    %1 = arith.addf %arg0, %0 : tensor<4xf32>
+    return %1 : tensor<4xf32>
+  }
+}
+"""
+
+
+def check_plan_merge_bytes():
+    ws = Workspace()
+    first = open_asm(ws, SOURCE_ASM, "first")
+    second = open_asm(ws, PLAN_ASM, "second")
+    ws.create_empty()
+    first.merge_to("output0", {"forward": "first"})
+    plan = second.plan_merge_to("output0", {"forward": "second"})
+    assert not plan.conflicts, plan.conflicts
+    assert plan.aliases == {"w": "w"}, plan.aliases
+    # @w is shared with the first module and i4 elements are packed.
+    assert plan.deduplicated_bytes == 16, plan
+    assert plan.imported_bytes == 2, plan
+    assert plan.rename_map == {"forward": "second"}, plan.rename_map
+
+
+CONFLICT_ASM = """
+module {
+  util.global private mutable @b = dense<0.0> : tensor<4xf32>
+  func.func @forward(%arg0: tensor<4xf32>) -> tensor<4xf32> {
+    util.global.store %arg0, @b : tensor<4xf32>
+    return %arg0 : tensor<4xf32>
+  }
+}
+"""
+
+
+def check_plan_merge_conflicts():
+    ws = Workspace()
+    source = open_asm(ws, CONFLICT_ASM, "conflict")
+    ws.create_empty()
+    # @b is imported under its own name before @forward is renamed onto it.
+    plan = source.plan_merge_to("output0", {"forward": "b"})
+    assert plan.conflicts, plan
+    try:
+        source.merge_to("output0", {"forward": "b"})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected merge_to to reject the conflicting rename")
+    assert "forward" in source.functions, source.functions
+
+
+COMPACT_ASM = """
+module {
+  util.global private @c = dense<[1.5, 2.5, 3.5, 4.5]> : tensor<4xf32>
+  util.global private @s = dense<[2.0, 2.0, 2.0, 2.0]> : tensor<4xf32>
+  util.global private @big = dense<[1.0, 1.0e+05, 0.0, 0.0]> : tensor<4xf32>
+  util.global @p = dense<[1.5, 2.5, 3.5, 4.5]> : tensor<4xf32>
+  func.func @forward(%arg0: tensor<4xf32>) -> tensor<4xf32> {
+    %0 = util.global.load @c : tensor<4xf32>
+    %1 = arith.addf %arg0, %0 : tensor<4xf32>
+    return %1 : tensor<4xf32>
+  }
+}
+"""
+
+
+def check_compact_constants():
+    ws = Workspace()
+    source = open_asm(ws, COMPACT_ASM, "compact")
+    savings = source.transforms.compact_constants("f16")
+    # @big overflows f16 and @p is public, so neither is touched.
+    assert savings == {"c": 8, "s": 14}, savings
+    asm = str(source.module)
+    assert "arith.extf" in asm, asm
+    assert "tensor<4xf16>" in asm, asm
+    assert "util.global @p = dense<[1.500000e+00" in asm, asm
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    check_merge_functions()
+    check_plan_merge_bytes()
+    check_plan_merge_conflicts()
+    check_compact_constants()
+    print("All checks passed")